@@ -9,6 +9,7 @@ __license__ = "GPLv3"
 import logging
 import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from oemof import db
 import numpy as np
 
@@ -46,41 +47,50 @@ try:
     # Sums the energy of all plants
     energy=0
 
-    # DataFrame of all plants
-    plants_df = pd.DataFrame(columns=['P_n', 'dV_n', 'h_n', 'dV_res', 'turb_type', 'simu', 'prod', 'power_output'])
-    plants_df = plants_df.astype(dtype={'P_n':float, 'dV_n':float, 'h_n':float, 'dV_res':float,
-                                        'turb_type':str, 'simu':bool, 'prod':float, 'power_output':pd.Series})
-
-    for i in plant_reg.index:
-        # Read the runoff time series of the raster cell in which the plant is (one time series per year)
-        sql_read = ("SELECT year, time_series FROM hydrolib.watergap_runoff WHERE geom_id=%s" % plant_reg.loc[i,'wg_id'])
-        discharge = pd.read_sql(sql_read, conn_oedb)
-
-        simu = False
-
-        # Remove empty 2/29 cell on leap years (no leap years in watergap) and concatenate in one time series over several years
-        ts_df=pd.DataFrame(columns=['dV'])
-        for j in discharge.index:
-            index_temp1=pd.date_range('1/1/%s'%discharge.loc[j,'year'], periods=59, freq='D')
-            index_temp2=pd.date_range('3/1/%s'%discharge.loc[j,'year'], periods=306, freq='D')
-            index_temp=index_temp1.append(index_temp2)
-            discharge_temp=np.asarray(discharge.loc[j, 'time_series'])
-            discharge_temp=discharge_temp[~np.isnan(discharge_temp)]
-            ts_df=ts_df.append(pd.DataFrame(index=index_temp,data={'dV':discharge_temp}))
-            # If the raster cell has modeled runoff data for the year to simulate, simulation of this plant is possible
-            if discharge.loc[j,'year']==year_to_simulate:
-                plants_with_ts=plants_with_ts+1
-                power_outputs=pd.DataFrame(index=index_temp)
-                simu=True
+    # Records of all plants, turned into a DataFrame once after the loop
+    records = []
+
+    # Read the runoff time series of all raster cells containing plants in one query
+    # (one row per cell and year) instead of one round-trip per plant
+    sql_read = "SELECT geom_id, year, time_series FROM hydrolib.watergap_runoff WHERE geom_id = ANY(%(ids)s)"
+    discharge_all = pd.read_sql(sql_read, conn_oedb, params={'ids': plant_reg['wg_id'].unique().tolist()})
+
+    # Remove empty 2/29 cell on leap years (no leap years in watergap) and concatenate in one time series over several years
+    runoff_cache = {}
+    for wg_id, discharge in discharge_all.groupby('geom_id'):
+        years = discharge['year'].to_numpy()
+        indices = [pd.date_range('1/1/%s' % y, periods=59, freq='D').append(
+                   pd.date_range('3/1/%s' % y, periods=306, freq='D')) for y in years]
+        full_index = indices[0].append(indices[1:]) if len(indices) > 1 else indices[0]
+        # Each watergap year holds 365 valid values plus an empty 2/29
+        # cell on leap years; np.compress drops it wherever it sits in
+        # the year in one vectorized pass
+        year_values = [np.asarray(ts, dtype=np.float64) for ts in discharge['time_series']]
+        full_values = np.concatenate(
+            [np.compress(~np.isnan(vals), vals) for vals in year_values])
+        runoff_cache[wg_id] = (pd.DataFrame({'dV': full_values}, index=full_index), years, indices)
+
+    def simulate_plant(i):
+        """
+        Simulate one plant and return (record, power_output or None).
+
+        Each plant is independent of the others, so the calls can be
+        dispatched to a thread pool; the modelchain time is dominated by
+        NumPy operations which release the GIL.
+        """
+        ts_df, years, indices = runoff_cache.get(
+            plant_reg.loc[i, 'wg_id'], (pd.DataFrame(columns=['dV']), np.array([]), []))
+
+        # If the raster cell has modeled runoff data for the year to simulate, simulation of this plant is possible
+        simu = bool((years == year_to_simulate).any())
 
         if simu:
             # Define the HydropowerPlant object and the ModelChain object based on available data
             my_hpp = HydropowerPlant(P_n=plant_reg.loc[i,'electrical_capacity']*1e3, name=plant_reg.loc[i,'id'])
             my_mc = Modelchain(hpp=my_hpp, dV=ts_df.loc[ts_df.index.year==year_to_simulate,:], dV_hist=ts_df)
             my_mc.run_model()
-            power_outputs[plant_reg.loc[i,'id']] = my_hpp.power_output
-            energy += my_hpp.power_output.sum()*24
-            plants_df.loc[my_hpp.name] = {
+            return {
+                'id': my_hpp.name,
                 'P_n': my_hpp.P_n,
                 'dV_n': my_hpp.dV_n,
                 'h_n': my_hpp.h_n,
@@ -89,18 +99,56 @@ try:
                 'simu': simu,
                 'prod':my_hpp.power_output.sum(),
                 'power_output': my_hpp.power_output.values
-            }
-        else:
-            plants_df.loc[plant_reg.loc[i,'id']] = {
-                'P_n': plant_reg.loc[i,'electrical_capacity']*1e3,
-                'dV_n': None,
-                'h_n': None,
-                'dV_res': None,
-                'turb_type': None,
-                'simu': simu,
-                'prod':0,
-                'power_output': None
-            }
+            }, my_hpp.power_output
+        return {
+            'id': plant_reg.loc[i,'id'],
+            'P_n': plant_reg.loc[i,'electrical_capacity']*1e3,
+            'dV_n': None,
+            'h_n': None,
+            'dV_res': None,
+            'turb_type': None,
+            'simu': simu,
+            'prod':0,
+            'power_output': None
+        }, None
+
+    with ThreadPoolExecutor() as executor:
+        results = list(executor.map(simulate_plant, plant_reg.index))
+
+    # One (timesteps, plants) float32 block instead of growing the frame by
+    # one column per simulated plant
+    power_mat = None
+    year_index = None
+    for pos, (record, power_output) in enumerate(results):
+        records.append(record)
+        if power_output is not None:
+            plants_with_ts = plants_with_ts + 1
+            energy += power_output.sum()*24
+            if power_mat is None:
+                year_index = power_output.index
+                power_mat = np.full((len(year_index), len(results)), np.nan, dtype=np.float32)
+            power_mat[:, pos] = power_output.to_numpy()
+    power_outputs = None
+    if power_mat is not None:
+        power_outputs = pd.DataFrame(power_mat, index=year_index,
+                                     columns=plant_reg['id'].to_numpy(), copy=False)
+
+    try:
+        # Build the result table as typed columnar Arrow buffers; the final
+        # to_pandas conversion is then a zero-copy view per column
+        import pyarrow as pa
+        schema = pa.schema([('id', pa.int64()), ('P_n', pa.float64()), ('dV_n', pa.float64()),
+                            ('h_n', pa.float64()), ('dV_res', pa.float64()),
+                            ('turb_type', pa.string()), ('simu', pa.bool_()), ('prod', pa.float64())])
+        scalar_fields = [field.name for field in schema]
+        table = pa.Table.from_pylist(
+            [{key: record[key] for key in scalar_fields} for record in records], schema=schema)
+        plants_df = table.to_pandas().set_index('id')
+        plants_df['power_output'] = [record['power_output'] for record in records]
+    except ImportError:
+        plants_df = pd.DataFrame.from_records(records).set_index('id')
+        plants_df = plants_df.astype(dtype={'P_n':float, 'dV_n':float, 'h_n':float, 'dV_res':float,
+                                            'simu':bool, 'prod':float})
 
     logging.info('\n%d from %d plants simulated \n\tEnergy produced : %d GWh' % (plants_with_ts, len(plants_df.index), energy/1e9))
     #plants_df.to_csv('example_oedb.csv', index=True)
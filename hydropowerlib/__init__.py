@@ -2,5 +2,5 @@ __copyright__ = "Copyright oemof developer group"
 __license__ = "GPLv3"
 __version__ = '0.1'
 
-from .hydropower_plant import HydropowerPlant
+from .hydropower_plant import HydropowerPlant, PlantFleet, HydropowerConfigError
 from .modelchain import Modelchain
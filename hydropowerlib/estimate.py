@@ -6,40 +6,252 @@ the parameters of a HydroPowerplant using historical river flow data.
 __copyright__ = "Copyright oemof developer group"
 __license__ = "GPLv3"
 
+import functools
+import json
 import logging
+import os
+from collections import namedtuple
+
+import numpy as np
 import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point
 
-from pkg_resources import resource_stream
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+from .hydropower_plant import HydropowerConfigError
 
 logger = logging.getLogger(__name__)
 
+# Edge arrays of one polygon ring: start vertices and edge vectors as
+# contiguous float64 arrays, precomputed once when the diagram is loaded
+_Edges = namedtuple('_Edges', ['v1x', 'v1y', 'dx', 'dy'])
+
+
+def _edges_from_ring(verts):
+    """
+    Precompute the edge start points and edge vectors of one closed ring.
+    """
+    v1, v2 = verts[:-1], verts[1:]
+    return _Edges(np.ascontiguousarray(v1[:, 0]),
+                  np.ascontiguousarray(v1[:, 1]),
+                  np.ascontiguousarray(v2[:, 0] - v1[:, 0]),
+                  np.ascontiguousarray(v2[:, 1] - v1[:, 1]))
+
+
+@functools.lru_cache(maxsize=4)
+def _load_polygons(file_turb_graph):
+    """
+    Load the characteristic zones of the turbine types from a diagram file.
+
+    Both the geojson diagram and the tabular `charac_diagrams.csv` layout
+    (one `<type>_dV_n` / `<type>_h_n` column pair per turbine type, NaN
+    padding after the last vertex) are understood; the format is picked
+    from the file extension. The parsed zones are cached per path, so
+    batch runs over many plants read and parse the file only once.
+
+    Returns a list of ``(turb_type, rings, bbox)`` tuples in file order,
+    where `rings` is a list of :py:data:`_Edges` tuples, one per polygon
+    ring of that zone (exterior rings first, then holes), and `bbox` is
+    the axis-aligned ``(x_min, x_max, y_min, y_max)`` bounding box of the
+    zone. The edge start points, edge vectors and bounding boxes are
+    geometric constants, so they are computed here instead of on every
+    classification.
+    """
+    if file_turb_graph.endswith('.csv'):
+        return _load_polygons_csv(file_turb_graph)
+
+    with open(file_turb_graph) as geojson_file:
+        collection = json.load(geojson_file)
+
+    polygons = []
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            coordinates = geometry['coordinates']
+        else:  # MultiPolygon
+            coordinates = [ring for polygon in geometry['coordinates'] for ring in polygon]
+        rings = []
+        all_verts = []
+        for ring in coordinates:
+            verts = np.asarray(ring, dtype=np.float64)
+            rings.append(_edges_from_ring(verts))
+            all_verts.append(verts)
+        all_verts = np.concatenate(all_verts)
+        bbox = (all_verts[:, 0].min(), all_verts[:, 0].max(),
+                all_verts[:, 1].min(), all_verts[:, 1].max())
+        polygons.append((feature['properties']['id'], rings, bbox))
+    return polygons
+
+
+def _load_polygons_csv(file_turb_graph):
+    """
+    Parse a tabular characteristic diagram into the same edge structure.
+
+    The column pairs are read once into a contiguous float matrix and
+    split per turbine type; the NaN padding rows of shorter polygons are
+    dropped with one vectorized mask per zone instead of per-cell checks.
+    """
+    table = pd.read_csv(file_turb_graph, index_col=0, dtype=np.float64)
+
+    polygons = []
+    for column in table.columns:
+        if not column.endswith('_dV_n'):
+            continue
+        turb_type = column[:-len('_dV_n')]
+        verts = table[[column, turb_type + '_h_n']].to_numpy(dtype=np.float64)
+        verts = verts[~np.isnan(verts).any(axis=1)]
+        if verts.shape[0] == 0:
+            continue
+        # Close the ring; the tabular layout stores each vertex only once
+        verts = np.concatenate([verts, verts[:1]])
+        bbox = (verts[:, 0].min(), verts[:, 0].max(),
+                verts[:, 1].min(), verts[:, 1].max())
+        polygons.append((turb_type, [_edges_from_ring(verts)], bbox))
+    return polygons
+
+
+def _ring_crossings(v1x, v1y, dx, dy, px, py):
+    """
+    Count the ray crossings of one ring for a single query point.
+
+    Scalar loop over the edge arrays; compiled with numba when available,
+    which removes the temporary-array allocations of the broadcast test
+    for the one-point-at-a-time classification path.
+    """
+    crossings = 0
+    for i in range(v1x.shape[0]):
+        if (v1y[i] > py) != (v1y[i] + dy[i] > py):
+            if px < v1x[i] + (py - v1y[i]) * dx[i] / dy[i]:
+                crossings += 1
+    return crossings
+
+
+if njit is not None:
+    _ring_crossings = njit(cache=True)(_ring_crossings)
+
+
+def _point_in_rings(rings, px, py):
+    """
+    Test whether point (px, py) lies in a polygon with the even-odd rule.
+
+    Casts a horizontal ray from the point and counts its crossings with
+    all polygon edges; an odd total means the point is inside. The
+    per-ring count runs as a numba-compiled scalar loop when numba is
+    installed and as a vectorized comparison over the precomputed edge
+    arrays otherwise.
+    """
+    crossings = 0
+    for edges in rings:
+        if njit is not None:
+            crossings += _ring_crossings(edges.v1x, edges.v1y, edges.dx, edges.dy, px, py)
+        else:
+            cond = (edges.v1y > py) != (edges.v1y + edges.dy > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = edges.v1x + (py - edges.v1y) * edges.dx / edges.dy
+            crossings += int(np.count_nonzero(cond & (px < x_cross)))
+    return crossings % 2 == 1
+
+# Breakpoints and values of the piecewise linear law [1] mapping the
+# dV_347 flow to the residual flow dV_res; the segments are continuous,
+# so the whole law is one interpolation table
+_DV347_XP = np.array([0.06, 0.16, 0.5, 2.5, 10., 60.])
+_DV347_FP = np.array([0.05, 0.13, 0.28, 0.9, 2.5, 10.])
+
+
+def _dV_res_from_dV_347(dV_347):
+    """
+    Evaluate the residual flow law on a dV_347 scalar or array.
+
+    A single np.interp over the breakpoint table instead of an if/elif
+    ladder, so the same call evaluates a single plant or a whole array
+    of candidate sites without Python-level branching.
+    """
+    return np.interp(dV_347, _DV347_XP, _DV347_FP, left=0.05, right=10.)
+
+
 def missing_parameters(hpp, dV_hist=None, file_turb_graph=None):
     if not can_estimate(hpp, dV_hist):
-        logger.error(f'The input data is not sufficient for plant {hpp.name}')
-        raise RuntimeError(f'The input data is not sufficient for plant {hpp.name}')
+        logger.error('The input data is not sufficient for plant %s', hpp.name)
+        raise HydropowerConfigError(f'The input data is not sufficient for plant {hpp.name}')
 
     if hpp.dV_res is None:
         dV_res_from_dV_hist(hpp, dV_hist)
     if hpp.dV_n is None:
         dV_n_from_dV_hist(hpp, dV_hist)
-    if hpp.P_n is None != hpp.h_n is None:
+    if (hpp.P_n is None) != (hpp.h_n is None):
         P_n_or_h_n_from_characteristic_equation_at_nominal_load(hpp)
     if hpp.turb_type is None:
         turb_type_from_phase_diagram(hpp, file_turb_graph)
 
     eta_g_n_from_P_n(hpp)
 
-    logger.debug(f'''
-        Plant {hpp.name}
-        ----------------
-        Nominal water flow  : {hpp.dV_n} m3/s
-        Nominal head        : {hpp.h_n} m
-        Nominal power       : {hpp.P_n} W
-        Residual water flow : {hpp.dV_res} m3/s
-        Turbine type        : {hpp.turb_type}
-    ''')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('\n'
+                     '    Plant %s\n'
+                     '    ----------------\n'
+                     '    Nominal water flow  : %s m3/s\n'
+                     '    Nominal head        : %s m\n'
+                     '    Nominal power       : %s W\n'
+                     '    Residual water flow : %s m3/s\n'
+                     '    Turbine type        : %s',
+                     hpp.name, hpp.dV_n, hpp.h_n, hpp.P_n, hpp.dV_res, hpp.turb_type)
+
+def turb_types_from_phase_diagram(dV_n, h_n, file_turb_graph=None):
+    """
+    Classify the turbine type of many plants in one batch.
+
+    Batch counterpart of :py:func:`turb_type_from_phase_diagram`,
+    specialized on the loaded diagram: the fleet's query points are
+    broadcast as (M, 1) columns against the precomputed (1, E) edge
+    arrays of each zone, so the crossing counts of all still-unresolved
+    plants are evaluated by one NumPy kernel per zone.
+
+    Parameters
+    ----------
+    dV_n : array_like
+        Nominal water flows in m3/s.
+    h_n : array_like
+        Nominal heads of water in m.
+    file_turb_graph : string
+        Name of the file containing the characteristic diagrams.
+
+    Returns
+    -------
+    numpy.ndarray
+        Turbine type per plant, 'dummy' where no zone matches.
+    """
+    if file_turb_graph is None:
+        file_turb_graph = 'turbines.geojson'
+    file_turb_graph = os.path.join(os.path.dirname(__file__), 'data', file_turb_graph)
+
+    turbines = _load_polygons(file_turb_graph)
+    px = np.atleast_1d(np.asarray(dV_n, dtype=np.float64))
+    py = np.atleast_1d(np.asarray(h_n, dtype=np.float64))
+
+    turb_types = np.full(px.shape[0], 'dummy', dtype=object)
+    unresolved = np.ones(px.shape[0], dtype=bool)
+    for turb_type, rings, (x_min, x_max, y_min, y_max) in turbines:
+        candidates = (unresolved & (px >= x_min) & (px <= x_max) &
+                      (py >= y_min) & (py <= y_max))
+        if not candidates.any():
+            continue
+        cand_px = px[candidates, None]
+        cand_py = py[candidates, None]
+        crossings = np.zeros(cand_px.shape[0], dtype=np.int64)
+        for edges in rings:
+            cond = (edges.v1y > cand_py) != (edges.v1y + edges.dy > cand_py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = edges.v1x + (cand_py - edges.v1y) * edges.dx / edges.dy
+            crossings += np.count_nonzero(cond & (cand_px < x_cross), axis=1)
+        inside = np.flatnonzero(candidates)[crossings % 2 == 1]
+        turb_types[inside] = turb_type
+        unresolved[inside] = False
+        if not unresolved.any():
+            break
+    return turb_types
+
 
 def can_estimate(hpp, dV_hist=None):
     """
@@ -75,30 +287,26 @@ def dV_res_from_dV_hist(hpp, dV_hist):
     if dV_hist is None:
         return 0
 
-    # Select last 10 years
-    start_from = max(dV_hist.index[0], dV_hist.index[-1] - pd.tseries.offsets.DateOffset(years=10))
-    dV_hist = dV_hist.loc[start_from:]
-
-    # Averaged yearly profile
-    dV_mean = dV_hist.groupby(dV_hist.index.dayofyear).mean()
+    # Select last 10 years (3653 days): integer datetime64 arithmetic plus
+    # a binary search instead of DateOffset maths and a label-based slice
+    cutoff = dV_hist.index.values[-1] - np.timedelta64(3653, 'D')
+    dV_hist = dV_hist.iloc[dV_hist.index.searchsorted(cutoff):]
+
+    # Averaged yearly profile: the day-of-year keys are a fixed 1..366
+    # set, so two bincounts replace the hash-based pandas groupby; gaps
+    # in the gauge record are masked out like the groupby mean skipped
+    # them
+    vals = dV_hist.to_numpy(dtype=np.float64).ravel()
+    doy = np.asarray(dV_hist.index.dayofyear)
+    valid = ~np.isnan(vals)
+    sums = np.bincount(doy[valid], weights=vals[valid], minlength=367)
+    counts = np.bincount(doy[valid], minlength=367)
+    dV_mean = sums[counts > 0] / counts[counts > 0]
 
     # 0.05 quantile <-> 347 day in flow duration curve
-    dV_347 = dV_mean.quantile(0.05)
-
-    if dV_347 <= 0.06:
-        hpp.dV_res = 0.05
-    elif dV_347 <= 0.16:
-        hpp.dV_res = 0.05 + (dV_347 - 0.06) * 8 / 10
-    elif dV_347 <= 0.5:
-        hpp.dV_res = 0.130 + (dV_347 - 0.16) * 4.4 / 10
-    elif dV_347 <= 2.5:
-        hpp.dV_res = 0.28 + (dV_347 - 0.5) * 31 / 100
-    elif dV_347 <= 10:
-        hpp.dV_res = 0.9 + (dV_347 - 2.5) * 21.3 / 100
-    elif dV_347 <= 60:
-        hpp.dV_res = 2.5 + (dV_347 - 10) * 150 / 1000
-    else:
-        hpp.dV_res = 10
+    dV_347 = np.nanquantile(dV_mean, 0.05)
+
+    hpp.dV_res = float(_dV_res_from_dV_347(dV_347))
 
     return hpp.dV_res
 
@@ -115,7 +323,10 @@ def dV_n_from_dV_hist(hpp, dV_hist):
     dV_n : float
     """
 
-    hpp.dV_n = (dV_hist - hpp.dV_res).quantile(0.8)
+    vals = dV_hist.to_numpy(dtype=np.float64).ravel()
+    # nanquantile keeps the skip-NaN behaviour of Series.quantile for
+    # gappy gauge records
+    hpp.dV_n = float(np.nanquantile(vals, 0.8)) - hpp.dV_res
 
     return hpp.dV_n
 
@@ -129,7 +340,8 @@ def P_n_or_h_n_from_characteristic_equation_at_nominal_load(hpp):
           eta_g_n=0.95 (nominal generator efficiency) and
           eta_t_n (nominal turbine efficiency)=0.9
     """
-    assert (hpp.h_n is not None or hpp.P_n is not None) and hpp.dV_n is None, "h_n and dV_n must be known for estimating P_n"
+    assert (hpp.h_n is not None or hpp.P_n is not None) and hpp.dV_n is not None, \
+        "dV_n and one of h_n or P_n must be known for estimating the other"
 
     eta_g_n = 0.95  # Assumed as 0.95
     eta_t_n = 0.9   # At full load the same for all turbine types
@@ -139,26 +351,25 @@ def P_n_or_h_n_from_characteristic_equation_at_nominal_load(hpp):
     elif hpp.P_n is None:
         hpp.P_n = hpp.h_n * hpp.dV_n * 9.81 * 1000 * eta_g_n * eta_t_n
 
+# Breakpoints (W) and efficiencies (%) of the piecewise linear law [1]
+# mapping nominal power to generator efficiency; the segments are
+# continuous, so the whole law is one interpolation table
+_ETA_G_XP = np.array([1e3, 5e3, 2e4, 1e5])
+_ETA_G_FP = np.array([80., 85., 90., 95.])
+
+
 def eta_g_n_from_P_n(hpp):
     r"""
     Calculate the nominal efficiency of the generator based on the nominal power of the plant
 
+    A single np.interp over the breakpoint table, so it evaluates a
+    scalar `P_n` as well as a fleet-sized array of nominal powers.
+
     References
     ----------
     [1] Bundesamt für Konjunkturfragen. Wahl, Dimensionierung und Abnahme einer Kleinturbine, 1995.
     """
-    P_n = hpp.P_n
-
-    if P_n < 1000:
-        eta_g_n = 80
-    elif P_n < 5000:
-        eta_g_n = 80 + (P_n - 1000) / 1000 * 5 / 4
-    elif P_n < 20000:
-        eta_g_n = 85 + (P_n - 5000) / 1000 * 5 / 15
-    elif P_n < 100000:
-        eta_g_n = 90 + (P_n - 20000) / 1000 * 5 / 80
-    else:
-        eta_g_n = 95
+    eta_g_n = np.interp(hpp.P_n, _ETA_G_XP, _ETA_G_FP, left=80., right=95.)
 
     hpp.eta_g_n = eta_g_n / 100
 
@@ -192,22 +403,26 @@ def turb_type_from_phase_diagram(hpp, file_turb_graph=None):
     """
 
     if file_turb_graph is None:
-        file_turb_graph = resource_stream(__name__, 'data/turbines.geojson')
-    else:
-        file_turb_graph = os.path.join(os.path.dirname(__file__), 'data', file_turb_graph)
+        file_turb_graph = 'turbines.geojson'
+    file_turb_graph = os.path.join(os.path.dirname(__file__), 'data', file_turb_graph)
 
     try:
-        turbines = gpd.read_file(file_turb_graph)
+        turbines = _load_polygons(file_turb_graph)
     except IOError:
-        logger.info(f'No file {file_turb_graph} in data folder')
+        logger.info('No file %s in data folder', file_turb_graph)
         raise
 
-    matching_turbines = turbines.loc[turbines.contains(Point(hpp.dV_n, hpp.h_n))]
-
-    if matching_turbines.empty:
-        hpp.turb_type = 'dummy'
-        logger.warning(f'Turbine type could not be defined for plant {hpp.name}. Dummy type used')
-    else:
-        hpp.turb_type = matching_turbines.id.iloc[0]
+    hpp.turb_type = 'dummy'
+    for turb_type, rings, (x_min, x_max, y_min, y_max) in turbines:
+        # Four scalar compares reject zones whose bounding box the point
+        # misses before any edge arithmetic runs
+        if not (x_min <= hpp.dV_n <= x_max and y_min <= hpp.h_n <= y_max):
+            continue
+        if _point_in_rings(rings, hpp.dV_n, hpp.h_n):
+            hpp.turb_type = turb_type
+            break
+
+    if hpp.turb_type == 'dummy':
+        logger.warning('Turbine type could not be defined for plant %s. Dummy type used', hpp.name)
 
     return hpp.turb_type
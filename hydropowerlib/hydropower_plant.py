@@ -8,10 +8,78 @@ hydropower plant.
 __copyright__ = "Copyright oemof developer group"
 __license__ = "GPLv3"
 
+import functools
 import os
+from collections import namedtuple
+
+import numpy as np
 import pandas as pd
 
-from pkg_resources import resource_stream
+try:
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa_csv = None
+
+
+# Known column types of the turbine parameter file; passing them to the
+# parser skips the per-column dtype inference
+_TURBINE_DTYPES = {'load_min': np.float64, 'eta_n': np.float64,
+                   'a1': np.float64, 'a2': np.float64, 'a3': np.float64}
+
+# Efficiency parameters of one turbine type as plain float attributes;
+# .a1 on a namedtuple is a tuple item load instead of a pandas row lookup
+TurbineParams = namedtuple('TurbineParams', ['load_min', 'eta_n', 'a1', 'a2', 'a3'])
+
+
+class HydropowerConfigError(ValueError):
+    """
+    Raised when the data describing a plant is insufficient or invalid.
+
+    Batch callers sweeping over many plants can catch this per plant and
+    continue with the rest of the fleet.
+    """
+
+
+@functools.lru_cache(maxsize=4)
+def _read_turbine_types(file_turb_eff):
+    """
+    Parse the turbine parameter file once per path.
+
+    Uses the memory-mapping pyarrow csv reader when available and the
+    pandas parser otherwise. The parsed frame is cached next to the csv
+    as parquet and reused while it is newer than the source, so the csv
+    tokenization only ever runs after the file changed. Returns the
+    parameter rows keyed by turbine type, so the per-plant lookup is a
+    dict hit instead of a fresh csv parse and DataFrame indexing on
+    every plant construction.
+    """
+    parquet_file = file_turb_eff + '.parquet'
+    try:
+        if os.path.getmtime(parquet_file) >= os.path.getmtime(file_turb_eff):
+            return _params_by_type(pd.read_parquet(parquet_file))
+    except (ImportError, OSError):
+        pass
+
+    if pa_csv is not None:
+        df = pa_csv.read_csv(file_turb_eff).to_pandas().set_index('type')
+    else:
+        df = pd.read_csv(file_turb_eff, index_col=0, dtype=_TURBINE_DTYPES,
+                         usecols=['type'] + list(_TURBINE_DTYPES))
+    try:
+        df.to_parquet(parquet_file)
+    except (ImportError, OSError):
+        pass
+    return _params_by_type(df)
+
+
+def _params_by_type(df):
+    """
+    Turn the parameter frame into {type: TurbineParams} scalar tuples.
+    """
+    columns = [df[field].to_numpy(dtype=np.float64) for field in TurbineParams._fields]
+    return {turb_type: TurbineParams(*(column[i] for column in columns))
+            for i, turb_type in enumerate(df.index)}
+
 
 class HydropowerPlant(object):
     r"""
@@ -70,6 +138,12 @@ class HydropowerPlant(object):
 
     """
 
+    # Slots make the per-plant attribute loads C-level slot reads and
+    # drop the instance __dict__, which matters when sweeps build many
+    # thousands of plants; eta_g_n is filled in by the estimate module
+    __slots__ = ('name', 'P_n', 'dV_n', 'h_n', 'dV_res', 'turb_type',
+                 'turb_num', 'turb_params', 'eta_g_n', 'power_output')
+
     def __init__(self, name, P_n=None, dV_n=None, h_n=None, dV_res=None, turb_type=None, turb_num=1):
 
         self.name = name
@@ -80,21 +154,106 @@ class HydropowerPlant(object):
         self.turb_type = turb_type
         self.turb_num = turb_num
         self.turb_params = None
+        self.eta_g_n = None
 
         self.power_output = None
 
     def load_turb_params(self, file_turb_eff=None):
         """
+        Look up the efficiency parameters of the plant's turbine type.
 
+        The parameter file is parsed lazily and cached per path, so
+        constructing many plants of the same fleet reads it only once.
         """
         if file_turb_eff is None:
-            file_turb_eff = resource_stream(__name__, 'data/turbine_type.csv')
-        else:
-            file_turb_eff = os.path.join(os.path.dirname(__file__), 'data', file_turb_eff)
+            file_turb_eff = 'turbine_type.csv'
+        file_turb_eff = os.path.join(os.path.dirname(__file__), 'data', file_turb_eff)
 
-        df = pd.read_csv(file_turb_eff, index_col=0)
+        turb_params = _read_turbine_types(file_turb_eff)
         try:
-            self.turb_params = df.loc[self.turb_type]
+            self.turb_params = turb_params[self.turb_type]
         except KeyError:
-            available_types = ", ".join(df.index)
+            available_types = ", ".join(turb_params)
             raise KeyError(f"Turbine type {self.turb_type} is not in {file_turb_eff} ({available_types})")
+
+class PlantFleet(object):
+    r"""
+    Structure-of-arrays view on the plants of a whole fleet.
+
+    Holds the scalar attributes of many plants in contiguous float64
+    arrays, with NaN marking unknown values. Estimation steps that are
+    the same arithmetic for every plant (e.g. completing `P_n` or `h_n`
+    from the characteristic equation at nominal load) then run as one
+    vectorized expression over the fleet instead of one Python pass per
+    plant.
+
+    Parameters
+    ----------
+    plants : iterable of HydropowerPlant
+        The plants the fleet is built from. The arrays are copies; use
+        :py:meth:`push` to write estimated values back onto the plants.
+
+    Attributes
+    ----------
+    plants : list of HydropowerPlant
+    P_n, dV_n, h_n, dV_res : numpy.ndarray
+        Per-plant scalars as float64 arrays, NaN where unknown.
+    turb_num : numpy.ndarray
+        Number of turbines per plant.
+
+    """
+
+    _COLUMNS = ('P_n', 'dV_n', 'h_n', 'dV_res')
+
+    def __init__(self, plants):
+        self.plants = list(plants)
+        for attr in self._COLUMNS:
+            values = [getattr(plant, attr) for plant in self.plants]
+            setattr(self, attr, np.array(
+                [np.nan if value is None else value for value in values],
+                dtype=np.float64))
+        self.turb_num = np.array([plant.turb_num for plant in self.plants], dtype=np.int64)
+
+    def complete_P_n_and_h_n(self):
+        r"""
+        Fill in missing `P_n` or `h_n` values over the whole fleet.
+
+        Vectorized form of the characteristic equation at nominal load
+        `P_n = h_n*dV_n*g*rho*eta_g_n*eta_t_n` (see
+        :py:func:`~.estimate.P_n_or_h_n_from_characteristic_equation_at_nominal_load`),
+        applied with boolean masks to every plant for which `dV_n` and
+        one of the two values are known.
+        """
+        eta_g_n = 0.95  # Assumed as 0.95
+        eta_t_n = 0.9   # At full load the same for all turbine types
+        factor = 9.81 * 1000 * eta_g_n * eta_t_n
+
+        known_dV_n = ~np.isnan(self.dV_n)
+        mask = np.isnan(self.P_n) & ~np.isnan(self.h_n) & known_dV_n
+        self.P_n[mask] = self.h_n[mask] * self.dV_n[mask] * factor
+        mask = np.isnan(self.h_n) & ~np.isnan(self.P_n) & known_dV_n
+        self.h_n[mask] = self.P_n[mask] / (self.dV_n[mask] * factor)
+
+    def classify_turb_types(self, file_turb_graph=None):
+        """
+        Classify the turbine type of every plant of the fleet in one batch.
+
+        Delegates to
+        :py:func:`~.estimate.turb_types_from_phase_diagram`, which
+        evaluates the whole fleet against each characteristic zone with a
+        single broadcast kernel, and assigns the result to the plants.
+        """
+        from . import estimate
+        turb_types = estimate.turb_types_from_phase_diagram(self.dV_n, self.h_n, file_turb_graph)
+        for plant, turb_type in zip(self.plants, turb_types):
+            plant.turb_type = turb_type
+        return turb_types
+
+    def push(self):
+        """
+        Write the fleet arrays back onto the HydropowerPlant objects.
+        """
+        for attr in self._COLUMNS:
+            column = getattr(self, attr)
+            for i, plant in enumerate(self.plants):
+                setattr(plant, attr, None if np.isnan(column[i]) else float(column[i]))
@@ -93,5 +93,6 @@ class Modelchain(object):
         self.hpp.load_turb_params(self.file_turb_eff)
 
         self.power_output = power_output.characteristic_equation(self.hpp, self.dV)
+        self.hpp.power_output = self.power_output
         return self
 
@@ -10,34 +10,72 @@ import os
 import logging
 import sys
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 __copyright__ = "Copyright oemof developer group"
 __license__ = "GPLv3"
 
 
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _power_kernel(dV, dV_n, P_n, h_n, eta_g_n, load_min, a1, a2, a3, out):
+        """
+        Fused scalar loop behind :py:func:`characteristic_equation`.
+
+        Computes part load, generator and turbine efficiency and the
+        power output in a single pass over the water flow array without
+        intermediate allocations. Compiled on first call and cached.
+        """
+        for i in range(dV.size):
+            dv = dV[i]
+            dv_pu = dv / dV_n
+            if dv_pu < load_min:
+                out[i] = 0.
+                continue
+            if dv_pu <= 0.1:
+                eta_g = 0.85
+            elif dv_pu <= 0.25:
+                eta_g = 0.85 + (dv_pu - 0.1) * (0.10 / 0.15)
+            elif dv_pu <= 0.5:
+                eta_g = 0.95 + (dv_pu - 0.25) * (0.05 / 0.25)
+            else:
+                eta_g = 1.
+            eta_g = eta_g * eta_g_n
+            if dv_pu < 1.:
+                eta_t = dv_pu / (a1 + a2 * dv_pu + a3 * dv_pu ** 2)
+                out[i] = eta_t * eta_g * 9.81 * 1000 * dv * h_n
+            else:
+                out[i] = P_n
+        return out
+
+
 def eta_g_eff(dV_pu, eta_g_n):
     r"""
     Determine efficiency of generator based on the part load and the nominal efficiency.
 
     Parameters
     ----------
-    dV_pu : pd.Series
+    dV_pu : numpy.ndarray
         load of the generator in values of P_n
     eta_g_n : float
         nominal efficiency of the generator
 
     Returns
     -------
-    eta_g_eff : pd.Series
+    eta_g_eff : numpy.ndarray
 
     References
     ----------
     [1] Bundesamt für Konjunkturfragen. Wahl, Dimensionierung und Abnahme einer Kleinturbine, 1995.
 
     """
-    return pd.Series(np.interp(dV_pu, [0.1, 0.25, 0.5], [0.85, 0.95, 1.], left=0.85, right=1.) * eta_g_n, dV_pu.index)
+    return np.interp(dV_pu, [0.1, 0.25, 0.5], [0.85, 0.95, 1.], left=0.85, right=1.) * eta_g_n
 
 
-def characteristic_equation(hpp, dV):
+def characteristic_equation(hpp, dV, out=None):
     r"""
     Calculates the plant power output.
 
@@ -47,6 +85,10 @@ def characteristic_equation(hpp, dV):
         Specifications of the hydropower plant
     dV : pandas.Series
         Water flow in m3/s.
+    out : numpy.ndarray, optional
+        Preallocated float buffer of the same length as `dV`. When given,
+        the power output is written into this buffer and the returned
+        Series wraps it without copying.
 
     Returns
     -------
@@ -68,7 +110,9 @@ def characteristic_equation(hpp, dV):
 
     It is assumed that the efficiency for water flows above the maximum
     water flow given in the efficiency curve is the nominal efficiency
-    (the water surplus will be drained over the dam)
+    (the water surplus will be drained over the dam). Below the minimal
+    load of the turbine type (`load_min`) the turbine stands still and
+    the output is zero.
 
     References
     ----------
@@ -78,15 +122,39 @@ def characteristic_equation(hpp, dV):
 
     """
 
-    dV = (dV - hpp.dV_res).clip(lower=0.)
+    # Unwrap to a raw float64 array up front; everything below runs on
+    # ndarrays and the index is only reattached to the final result
+    index = dV.index
+    dV = np.maximum(dV.to_numpy(dtype=np.float64) - hpp.dV_res, 0.)
 
-    dV_pu = dV / hpp.dV_n
-    eta_g = eta_g_eff(dV_pu, hpp.eta_g_n)
+    a1, a2, a3 = hpp.turb_params.a1, hpp.turb_params.a2, hpp.turb_params.a3
+
+    if out is None:
+        out = np.empty(dV.size)
 
-    a1, a2, a3 = hpp.turb_params.loc[["a1", "a2", "a3"]]
-    eta_t = dV_pu / (a1 + a2 * dV_pu + a3 * dV_pu**2)
+    if njit is not None:
+        _power_kernel(dV, float(hpp.dV_n),
+                      float(hpp.P_n), float(hpp.h_n), float(hpp.eta_g_n),
+                      float(hpp.turb_params.load_min), float(a1), float(a2), float(a3), out)
+        return pd.Series(out, index=index, name="feedin_hydropower_plant", copy=False)
 
-    power_output = (eta_t * eta_g * 9.81 * 1000 * dV * hpp.h_n).where(dV_pu < 1., other=hpp.P_n)
+    dV_pu = dV / hpp.dV_n
+    eta_g = eta_g_eff(dV_pu, hpp.eta_g_n)
 
-    return power_output.rename("feedin_hydropower_plant")
+    # eta_t = dV_pu / (a1 + a2*dV_pu + a3*dV_pu^2), built in the output
+    # buffer with in-place ufuncs so the whole expression allocates no
+    # intermediate arrays beyond dV_pu and eta_g
+    np.multiply(dV_pu, a3, out=out)
+    out += a2
+    out *= dV_pu
+    out += a1
+    np.divide(dV_pu, out, out=out)
+
+    out *= eta_g
+    out *= dV
+    out *= 9.81 * 1000 * hpp.h_n
+    out[dV_pu >= 1.] = hpp.P_n
+    # Below the minimal load of the turbine type no power is produced
+    out[dV_pu < hpp.turb_params.load_min] = 0.
+    return pd.Series(out, index=index, name="feedin_hydropower_plant", copy=False)
 
@@ -26,7 +26,7 @@ import sys
 import geopandas as gpd
 from scipy.io import loadmat
 from shapely.geometry import Polygon
-from shapely.ops import cascaded_union as union
+from shapely.ops import unary_union as union
 from operator import itemgetter
 from subprocess import run
 from collections import OrderedDict
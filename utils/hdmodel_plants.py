@@ -10,11 +10,20 @@ import numpy as np
 import pandas as pd
 import geopandas as gpd
 import fiona
-from shapely.geometry import Point
+from shapely.geometry import mapping
+import functools
+import hashlib
 import os
 import saio
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from subprocess import run
 
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
 import sqlalchemy as sa
 from sqlalchemy.orm import sessionmaker
 from geoalchemy2.types import Geometry
@@ -40,6 +49,19 @@ HYDRO_BASINS_DATA_PATH_TEMPLATE = os.path.join(
 )
 
 def load_feature(shpfn, **selector):
+    if pyogrio is not None:
+        # Push the selector down to OGR as an attribute filter, so the
+        # non-matching records are skipped in C without decoding their
+        # geometries
+        where = " AND ".join(f"{k} = {v!r}" for k, v in selector.items())
+        matches = pyogrio.read_dataframe(shpfn, where=where, max_features=1)
+        if matches.empty:
+            raise KeyError(f"Selector {selector} did not find any matching feature.")
+        row = matches.iloc[0]
+        return {"type": "Feature",
+                "geometry": mapping(row.geometry),
+                "properties": row.drop("geometry").to_dict()}
+
     with fiona.open(shpfn) as fin:
         def is_match(x):
             return all(x[k] == v for k, v in selector.items())
@@ -53,11 +75,87 @@ def load_hydrobasins_feature(hybas_id, hydrobasins_data_path_template=HYDRO_BASI
     return load_feature(hydrobasins_data_path_template.format(level), HYBAS_ID=hybas_id)
 
 def load_hydrobasins_cover(river_map=RIVER_MAP, hydrobasins_data_path_template=HYDRO_BASINS_DATA_PATH_TEMPLATE):
+    # The cover is deterministic in its inputs, so it is persisted next
+    # to the HydroBASINS data; the file name encodes the inputs so a
+    # different river map or template gets its own cache
+    cache_key = hashlib.md5(repr((sorted(river_map.items()),
+                                  hydrobasins_data_path_template)).encode()).hexdigest()[:12]
+    cache_path = os.path.join(os.path.dirname(hydrobasins_data_path_template),
+                              f'_cover_{cache_key}.parquet')
+    try:
+        return gpd.read_parquet(cache_path)
+    except (ImportError, OSError):
+        pass
+
+    cover = _build_hydrobasins_cover(river_map, hydrobasins_data_path_template)
+    try:
+        cover.to_parquet(cache_path)
+    except (ImportError, OSError):
+        pass
+    return cover
+
+def _build_hydrobasins_cover(river_map, hydrobasins_data_path_template):
+    if pyogrio is not None:
+        # One bulk read per HydroBASINS level instead of one shapefile
+        # scan per river
+        by_level = defaultdict(list)
+        for hybas_id in river_map:
+            by_level[str(hybas_id)[1:3]].append(hybas_id)
+        frames = [
+            pyogrio.read_dataframe(
+                hydrobasins_data_path_template.format(level),
+                where=f"HYBAS_ID IN ({','.join(map(str, ids))})")
+            for level, ids in by_level.items()]
+        cover = pd.concat(frames).set_index('HYBAS_ID').loc[list(river_map)]
+        return cover.set_index(pd.Index(river_map.values(), name="GEESTHACHT_ID"))
+
     features = [load_hydrobasins_feature(i, hydrobasins_data_path_template) for i in river_map.keys()]
     return gpd.GeoDataFrame.from_features(features).set_index(pd.Index(river_map.values(), name="GEESTHACHT_ID"))
 
-def load_hydrobasins(level='12', hydrobasins_data_path_template=HYDRO_BASINS_DATA_PATH_TEMPLATE):
-    return gpd.read_file(hydrobasins_data_path_template.format(level))
+@functools.lru_cache(maxsize=4)
+def _load_hydrobasins_cached(path, columns, bbox):
+    if pyogrio is not None:
+        # Column projection and the bounding-box filter run inside OGR,
+        # so only the needed part of the level-12 file is materialized
+        return pyogrio.read_dataframe(path, columns=list(columns) if columns else None, bbox=bbox)
+    hydrobasins = gpd.read_file(path, bbox=bbox)
+    if columns is not None:
+        hydrobasins = hydrobasins[list(columns) + ['geometry']]
+    return hydrobasins
+
+def load_hydrobasins(level='12', hydrobasins_data_path_template=HYDRO_BASINS_DATA_PATH_TEMPLATE,
+                     columns=None, bbox=None):
+    # Memoized per (path, columns, bbox), so repeated formatter calls
+    # skip the multi-million polygon parse of the level-12 layer
+    return _load_hydrobasins_cached(
+        hydrobasins_data_path_template.format(level),
+        tuple(columns) if columns is not None else None,
+        tuple(bbox) if bbox is not None else None)
+
+def _river_indices(points, hydrobasins_cover):
+    """
+    Resolve the basin id of every point with one bulk spatial-index query.
+
+    Queries the cover's spatial index with all points at once, so the
+    bounding-box pruning and the containment tests run in C over the
+    whole batch instead of once per point. Points outside every basin
+    keep the -1 sentinel.
+    """
+    sindex = hydrobasins_cover.sindex
+    # query_bulk was folded into query in geopandas 1.0
+    bulk_query = getattr(sindex, 'query_bulk', sindex.query)
+    pt_idx, tree_idx = bulk_query(points.geometry, predicate='within')
+
+    multi = np.count_nonzero(np.bincount(pt_idx, minlength=len(points)) > 1)
+    if multi:
+        print(f"{multi} points in more than one basin; keeping the first match")
+
+    # Keep the first matching basin per point (np.unique returns the
+    # earliest occurrence of every point index)
+    matched, first_pos = np.unique(pt_idx, return_index=True)
+    river_idx = np.full(len(points), -1, dtype=np.int64)
+    river_idx[matched] = hydrobasins_cover.index.to_numpy()[tree_idx[first_pos]]
+    return pd.Series(river_idx, index=points.index)
 
 def get_fred_powerplants_from_oep(user=None, token=None):
 
@@ -76,7 +174,15 @@ def get_fred_powerplants_from_oep(user=None, token=None):
     Session = sessionmaker(bind=engine)
     session = Session()
 
-    return saio.as_pandas(session.query(FredDpHydropower)).to_crs(epsg=4326)
+    # Project the columns server-side; only the three the formatter
+    # consumes cross the wire instead of the full view, and PostGIS
+    # reprojects to WGS84 before the rows leave the database
+    query = session.query(FredDpHydropower.hydropower_id,
+                          sa.func.ST_Transform(FredDpHydropower.geom, 4326).label('geom'),
+                          FredDpHydropower.city)
+    powerplants = saio.as_pandas(query)
+    powerplants.crs = 'EPSG:4326'
+    return powerplants
 
 def format_fred_powerplants(
         powerplants_fname='fred_formatted.txt',
@@ -89,40 +195,102 @@ def format_fred_powerplants(
     if hydrobasins_cover is None:
         hydrobasins_cover = load_hydrobasins_cover(hydrobasins_river_map, hydrobasins_data_path_template)
 
-    def find_river_idx(point):
-        idx = hydrobasins_cover.index[hydrobasins_cover.contains(point)]
-        if idx.empty:
-            return -1
-        elif len(idx) > 1:
-            print(f"{point.xy} in more than one basin: {list(hydrobasins_cover.index[contains_b])}")
-        return idx[0]
+    # Make geom the active geometry column so the bulk GeoSeries
+    # accessors apply, and extract the coordinates once in C
+    powerplants = powerplants.set_geometry('geom')
+    lon = powerplants.geometry.x.to_numpy()
+    lat = powerplants.geometry.y.to_numpy()
 
-    river_idx = powerplants.geom.map(find_river_idx)
+    river_idx = _river_indices(powerplants.geometry, hydrobasins_cover)
 
     powerplants['estim_up_area'] = estimate_upstream_area(powerplants, hydrobasins_data_path_template=hydrobasins_data_path_template)
 
-    formatted_powerplants = pd.DataFrame({
-        'Hydro-Id': powerplants.hydropower_id,
-        'Cat.': river_idx,
-        'Longitude': powerplants.geom.x,
-        'Latitude': powerplants.geom.y,
-        'ilon': 0,
-        'ilat': 0,
-        'HD5 Area': 0,
-        'Obs. Area': powerplants.estim_up_area,
-        'City': powerplants.city
-    })
-
-    # save the formatted grdc station file to a fixed with file
+    # save the formatted powerplant file to a fixed with file; the
+    # columns go to the writer as plain arrays (Hydro-Id, Cat.,
+    # Longitude, Latitude, ilon, ilat, HD5 Area, Obs. Area, City)
+    zeros = np.zeros(len(powerplants), dtype=np.int64)
     header = "Hydro-Id Cat. Longitude  Latitude  ilon ilat HD5 Area  Obs. Area City\n"
-    fmt = '%8d %4d % 9.4f % 9.4f %5d %4d %8.f. %8.f. %1s'
-    np.savetxt(powerplants_fname, formatted_powerplants.values, fmt=fmt, header=header, comments="")
+    fmts = ('%8d', ' %4d', ' % 9.4f', ' % 9.4f', ' %5d', ' %4d', ' %8.f.', ' %8.f.', ' %1s')
+    _write_fixed_width(powerplants_fname, header, fmts, [
+        powerplants.hydropower_id.to_numpy(),
+        river_idx.to_numpy(),
+        lon,
+        lat,
+        zeros,
+        zeros,
+        zeros,
+        powerplants.estim_up_area.to_numpy(),
+        powerplants.city.to_numpy(),
+    ])
+
+# Station count above which the containment query is worth forking
+# worker processes for; below it the pickling overhead dominates
+_PARALLEL_SJOIN_THRESHOLD = 50000
+
+# The GRDC columns the station formatter actually consumes
+_GRDC_COLUMNS = ['grdc_no', 'country', 'long', 'lat', 'area', 'station']
+
+def _load_grdc_cached(grdc_path, country_code=None):
+    """
+    Read the GRDC station table, preferring a parquet sidecar.
+
+    pd.read_excel goes through openpyxl's pure-Python XML parser on
+    every run; the parsed table is cached next to the Excel file as
+    parquet on first use and read back with column projection while it
+    is newer than the source. Both cache paths are best-effort. The
+    country filter is applied as a parquet predicate (or right after
+    the Excel parse), so callers never see stations of other countries.
+    """
+    cache_path = grdc_path + '.parquet'
+    filters = [('country', '=', country_code)] if country_code is not None else None
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(grdc_path):
+            return pd.read_parquet(cache_path, columns=_GRDC_COLUMNS, filters=filters)
+    except (ImportError, OSError):
+        pass
+
+    grdc = pd.read_excel(grdc_path, na_values=[-999])
+    try:
+        grdc.to_parquet(cache_path)
+    except (ImportError, OSError):
+        pass
+    if country_code is not None:
+        grdc = grdc.loc[grdc.country == country_code]
+    return grdc
+
+def _write_fixed_width(fname, header, fmts, columns):
+    """
+    Write a fixed-width table with C-level np.char formatting.
+
+    Formats each column once with np.char.mod and concatenates the
+    pieces with np.char.add, instead of np.savetxt's per-row Python %
+    formatting over an object array.
+    """
+    # Each column is formatted in one contiguous pass; ascontiguousarray
+    # is a no-op for the usual to_numpy() outputs but guards against
+    # strided views being fed through the char kernels
+    lines = np.char.mod(fmts[0], np.ascontiguousarray(columns[0]))
+    for fmt, column in zip(fmts[1:], columns[1:]):
+        lines = np.char.add(lines, np.char.mod(fmt, np.ascontiguousarray(column)))
+    with open(fname, 'w') as fout:
+        # np.savetxt appended its own newline after the header, leaving
+        # a blank line before the first data row; keep that layout for
+        # the external fixed-format readers
+        fout.write(header + '\n')
+        fout.write('\n'.join(lines))
+        fout.write('\n')
 
 def estimate_upstream_area(plants, hydrobasins=None, hydrobasins_data_path_template=HYDRO_BASINS_DATA_PATH_TEMPLATE):
     if hydrobasins is None:
-        hydrobasins = load_hydrobasins(level='12', hydrobasins_data_path_template=hydrobasins_data_path_template)
+        # Restrict the read to the bounding box of the plants; basins
+        # outside it could never match in the join anyway
+        hydrobasins = load_hydrobasins(level='12', hydrobasins_data_path_template=hydrobasins_data_path_template,
+                                       columns=['UP_AREA'], bbox=tuple(plants.total_bounds))
+    # Touch the spatial index so the STRtree is built on (and cached
+    # with) the memoized frame instead of inside every sjoin
+    hydrobasins.sindex
 
-    return gpd.sjoin(plants, hydrobasins[['UP_AREA', 'geometry']], how='left', op='within').UP_AREA
+    return gpd.sjoin(plants, hydrobasins[['UP_AREA', 'geometry']], how='left', predicate='within').UP_AREA
 
 
 def format_station_file(
@@ -139,46 +307,66 @@ def format_station_file(
         hydrobasins_cover = load_hydrobasins_cover(hydrobasins_river_map, hydrobasins_data_path_template)
 
     if grdc is None:
-        # load the grdc data
-        grdc = pd.read_excel(grdc_path, na_values=[-999])
-
-    if country_code is not None:
+        # load the grdc data with the country filter pushed into the
+        # read, so the geometry work below only sees selected stations
+        grdc = _load_grdc_cached(grdc_path, country_code)
+    elif country_code is not None:
         # select data from a country only
         grdc = grdc.loc[grdc.country == country_code]
 
-    def find_river_idx(point):
-        idx = hydrobasins_cover.index[hydrobasins_cover.contains(point)]
-        if idx.empty:
-            return -1
-        elif len(idx) > 1:
-            print(f"{point.xy} in more than one basin: {list(hydrobasins_cover.index[contains_b])}")
-        return idx[0]
-
-    river_idx = grdc[["long", "lat"]].apply(Point, axis=1).map(find_river_idx)
-
-    formatted_grdc = pd.DataFrame({
-        'GRDC-No.': grdc.grdc_no,
-        'Cat.': river_idx,
-        'Longitude': grdc.long,
-        'Latitude': grdc.lat,
-        'ilon': 0,
-        'ilat': 0,
-        'HD5 Area': 0,
-        'Obs. Area': grdc.area,
-        'Station': grdc.station
-    })
-
-    # save the formatted grdc station file to a fixed with file
+    # Materialize the coordinates once; the same two arrays feed the
+    # point construction and the output columns
+    lonlat = grdc[['long', 'lat']].to_numpy(dtype=np.float64, copy=False)
+    lon, lat = lonlat[:, 0], lonlat[:, 1]
+
+    # One bulk containment query over all stations instead of a
+    # Python-level point-by-point basin lookup
+    points = gpd.GeoDataFrame(
+        {'geometry': gpd.points_from_xy(lon, lat)},
+        crs=hydrobasins_cover.crs, index=grdc.index)
+    if len(points) > _PARALLEL_SJOIN_THRESHOLD:
+        # Country-scale dumps: the query is embarrassingly parallel over
+        # the stations, so chunk them across worker processes
+        n_workers = os.cpu_count() or 1
+        # Split positional ranges, not the frame itself: np.array_split
+        # on a GeoDataFrame coerces the chunks to plain ndarrays on
+        # recent pandas, losing the geometry accessor
+        chunks = [points.iloc[idx[0]:idx[-1] + 1]
+                  for idx in np.array_split(np.arange(len(points)), n_workers) if idx.size]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            river_idx = pd.concat(executor.map(_river_indices, chunks, [hydrobasins_cover] * n_workers))
+    else:
+        river_idx = _river_indices(points, hydrobasins_cover)
+
+    # save the formatted grdc station file to a fixed with file; the
+    # columns go to the writer as plain arrays (GRDC-No., Cat.,
+    # Longitude, Latitude, ilon, ilat, HD5 Area, Obs. Area, Station)
+    zeros = np.zeros(len(grdc), dtype=np.int64)
     header = "GRDC-No. Cat. Longitude  Latitude  ilon ilat HD5 Area  Obs. Area Station\n"
-    fmt = ' %i %4d % 9.4f % 9.4f %5d %4d %8.f. %8.f. %1s'
-    np.savetxt(station_fname, formatted_grdc.values, fmt=fmt, header=header, comments="")
+    fmts = (' %i', ' %4d', ' % 9.4f', ' % 9.4f', ' %5d', ' %4d', ' %8.f.', ' %8.f.', ' %1s')
+    _write_fixed_width(station_fname, header, fmts, [
+        grdc.grdc_no.to_numpy(),
+        river_idx.to_numpy(),
+        lon,
+        lat,
+        zeros,
+        zeros,
+        zeros,
+        grdc.area.to_numpy(),
+        grdc.station.to_numpy(),
+    ])
 
     return grdc
 
 
 if __name__ == '__main__':
-    format_station_file()
+    # Build the cover and its spatial index once; both formatters query
+    # the same tree instead of re-reading the shapefiles
+    cover = load_hydrobasins_cover()
+    cover.sindex
+
+    format_station_file(hydrobasins_cover=cover)
 
     powerplants = get_fred_powerplants_from_oep()
 
-    format_fred_powerplants(powerplants=powerplants)
+    format_fred_powerplants(powerplants=powerplants, hydrobasins_cover=cover)